@@ -1,8 +1,81 @@
 from financial_modeling_prep.constants import Constants
+from .metrics import Metrics
 from .risk import Risk
-import json
+import numpy as np
+
+def _project_and_discount(last_revenue, revenue_growth_rate, net_income_margins_percentage, free_cash_flow_rate_percentage, r, terminal_value_multiple, years_to_project):
+    """
+    Projects future free cash flow and discounts it, along with the terminal value,
+    back to today's value in a single pass. The company inputs can either be floats
+    for one company or equally sized arrays to value many companies at once.
+
+    FCF(t) = revenue * (1 + revenue growth) ^ t * net income margins * free cash flow rate
+    TV = FCF(years) * terminal value multiple
+    today's value = sum(FCF(t) / (1 + r) ^ t) + TV / (1 + r) ^ years, where 1 <= t <= years
+
+    Parameters
+    ----------
+    last_revenue : float or np.ndarray
+        revenue of the most recent historical year
+
+    revenue_growth_rate : float or np.ndarray
+        rate used to estimate future revenue
+
+    net_income_margins_percentage : float or np.ndarray
+        rate used to estimate future net income
+
+    free_cash_flow_rate_percentage : float or np.ndarray
+        rate used to estimate future free cash flow
+
+    r : float
+        required rate of return
+
+    terminal_value_multiple : float
+        (1 + g) / (r - g), where g = perpetual growth rate
+
+    years_to_project : int
+        number of years in the future to project to
+
+    Returns
+    -------
+    float or np.ndarray, float or np.ndarray
+        first return is today's total value for the company, i.e. market cap
+        second return is the terminal value
+    """
+    # the growth and discount factors are carried forward a year at a time rather than
+    # raised to the power of t, and no intermediate projections are kept around
+    revenue = last_revenue
+    discount_factor = 1.0
+    free_cash_flow = 0.0
+    today_value = 0.0
+    for _ in range(years_to_project):
+        # not updated in place, `last_revenue` may be the caller's array
+        revenue = revenue * (1.0 + revenue_growth_rate)
+        free_cash_flow = revenue * net_income_margins_percentage * free_cash_flow_rate_percentage
+        discount_factor *= 1.0 + r
+        today_value += free_cash_flow / discount_factor
+
+    terminal_value = free_cash_flow * terminal_value_multiple
+    today_value += terminal_value / discount_factor
+
+    return today_value, terminal_value
 
 class DiscountedCashFlowModel:
+    __slots__ = (
+        "required_rate_of_return",
+        "years_to_project",
+        "risk",
+        "perpetual_growth_rate",
+        "margin_of_safety",
+        "logger",
+        "_r",
+        "_g",
+        "_mos_mul",
+        "_tv_numerator_mult",
+        "_tv_denominator",
+        "_reduce"
+    )
+
     def __init__(self, required_rate_of_return, years_to_project, risk, perpetual_growth_rate, margin_of_safety, logger):
         self.required_rate_of_return = required_rate_of_return
         self.years_to_project = years_to_project
@@ -11,6 +84,20 @@ class DiscountedCashFlowModel:
         self.margin_of_safety = margin_of_safety
         self.logger = logger
 
+        # invariants of the model, computed once rather than per ticker
+        self._r = self.required_rate_of_return / 100.0
+        self._g = self.perpetual_growth_rate / 100.0
+        self._mos_mul = 1.0 - (self.margin_of_safety / 100.0)
+        self._tv_numerator_mult = 1.0 + self._g
+        self._tv_denominator = self._r - self._g
+
+        # reduction used to choose a percentage, anything other than conservative or moderate is bullish
+        self._reduce = {
+            Risk.CONSERVATIVE: np.min,
+            Risk.MODERATE: np.mean,
+            Risk.BULLISH: np.max
+        }.get(self.risk, np.max)
+
     def calculate(self, symbol, financials, quotes):
         """
         Performs the DCF model for a specific company using historical and current
@@ -43,36 +130,78 @@ class DiscountedCashFlowModel:
             first return is the fair value
             second return is the fair value with a margin of safety applied to it
         """
-        self.logger.debug("--- DiscountedCashFlowModel.calculate ---\n")
+        [(fair_value, fair_with_margin_of_safety)] = self.calculate_batch([symbol], [financials], [quotes])
 
-        # step 1 : combine revenue, net income, and free cash flow
-        metrics = self._combine_metrics(financials)
+        return fair_value, fair_with_margin_of_safety
 
-        # step 2 : calculate percentage from FCF to Net Income
-        free_cash_flow_rate_percentage = self._calculate_free_cash_flow_rate(metrics)
+    def calculate_batch(self, symbols, financials, quotes):
+        """
+        Performs the DCF model for many companies at once. The historical metrics are
+        reduced to a handful of percentages per company, then the projection, discounting,
+        and fair value steps run once over arrays holding every company.
 
-        # step 3 : calculate the revenue growth rate estimate
-        revenue_growth_rate = self._calculate_revenue_growth_rate(metrics)
+        Parameters
+        ----------
+        symbols : array<str>
+            ticker symbols
 
-        # step 4 : calculate net income margins percentage
-        net_income_margins_percentage = self._calculate_net_income_margins_percentage(metrics)
+        financials : array<dict>
+            financial data for each ticker symbol, in the same order as `symbols`
 
-        # step 5 : apply calculated percentages from step 2, 3, and 4 to estimate future revenue, net income, and free cash flow
-        future_metrics = self._estimate_future_metrics(metrics, free_cash_flow_rate_percentage, revenue_growth_rate, net_income_margins_percentage)
+            structure of each dict can be found in `calculate`
 
-        # step 6 : calculate our terminal value
-        terminal_value = self._calculate_terminal_value(future_metrics[-1])
+        quotes : array<array<dict>>
+            quote data for each ticker symbol, in the same order as `symbols`
 
-        # step 7 : calculate and sum the present value of future cash flow to get today's value
-        today_value = self._calculate_today_value(future_metrics, terminal_value)
+            structure of each array can be found in `calculate`
 
-        # step 8 : calculate fair value
-        fair_value = self._calculate_fair_value(quotes, today_value)
+        Returns
+        -------
+        array<(float, float)>
+            fair value and fair value with a margin of safety applied to it, for each ticker symbol
 
-        # step 9 : apply our margin of safety
-        fair_with_margin_of_safety = self._apply_margin_of_safety(fair_value)
+        Raises
+        ------
+        ValueError
+            if `symbols`, `financials`, and `quotes` differ in length
 
-        return fair_value, fair_with_margin_of_safety
+        The batch is all or nothing, bad data for one company raises for the whole batch.
+        """
+        self.logger.debug("--- DiscountedCashFlowModel.calculate_batch ---\n")
+
+        n = len(symbols)
+        if len(financials) != n or len(quotes) != n:
+            raise ValueError(f"symbols, financials, and quotes must have the same length, got {n}, {len(financials)}, and {len(quotes)}.")
+
+        last_revenue = np.empty(n, dtype=np.float64)
+        free_cash_flow_rate_percentage = np.empty(n, dtype=np.float64)
+        revenue_growth_rate = np.empty(n, dtype=np.float64)
+        net_income_margins_percentage = np.empty(n, dtype=np.float64)
+
+        # like the scalar math this replaced, a zero denominator should fail the calculation rather
+        # than quietly produce inf or nan
+        with np.errstate(divide="raise", invalid="raise"):
+            for i, (symbol, symbol_financials) in enumerate(zip(symbols, financials)):
+                self.logger.debug("symbol -> %s\n", symbol)
+
+                # step 1 : combine revenue, net income, and free cash flow
+                metrics = self._combine_metrics(symbol_financials)
+
+                # step 2 : calculate percentage from FCF to Net Income, the revenue growth rate estimate, and net income margins percentage
+                free_cash_flow_rate_percentage[i], revenue_growth_rate[i], net_income_margins_percentage[i] = self._calculate_rates(metrics)
+                last_revenue[i] = metrics.revenue[-1]
+
+            # step 3 : apply calculated percentages from step 2 to estimate future free cash flow, then
+            # sum the present value of it and of the terminal value to get today's value
+            today_value = self._calculate_today_value(last_revenue, free_cash_flow_rate_percentage, revenue_growth_rate, net_income_margins_percentage)
+
+            # step 4 : calculate fair value
+            fair_value = self._calculate_fair_value(quotes, today_value)
+
+            # step 5 : apply our margin of safety
+            fair_with_margin_of_safety = self._apply_margin_of_safety(fair_value)
+
+        return list(zip(fair_value.tolist(), fair_with_margin_of_safety.tolist()))
 
     def _combine_metrics(self, financials):
         """
@@ -93,494 +222,166 @@ class DiscountedCashFlowModel:
 
         Returns
         -------
-        array<dict>
+        Metrics
             An aggregation of revenue, net income, and free cash flow for all available data.
-            Array is sorted in ascending order by year
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
+            Each field is an array sorted in ascending order by year
         """
-        def _calculate_free_cash_flow(cash_flow_year):
-            """
-            Calculates free cash flow using the cash flow statement.
-            FCF = Cash Flow from Operations - Capex
-
-            Parameters
-            ----------
-            cash_flow_year : dict
-                cash flow metrics from the financials
-
-            Returns
-            -------
-            float
-                free cash flow calculation
-            """
-            return float(cash_flow_year[Constants.CASH_FLOW_STATEMENT.OPERATING_CASH_FLOW]) - float(cash_flow_year[Constants.CASH_FLOW_STATEMENT.CAPITAL_EXPENDITURE])
-                
         self.logger.debug("--- Step # 1 -> DiscountedCashFlowModel._combine_metrics ---")
 
+        # resolve the statement keys once rather than once per row
+        income_date_key = Constants.INCOME_STATEMENT.DATE
+        revenue_key = Constants.INCOME_STATEMENT.REVENUE
+        net_income_key = Constants.INCOME_STATEMENT.NET_INCOME
+        cash_flow_date_key = Constants.CASH_FLOW_STATEMENT.DATE
+        operating_cash_flow_key = Constants.CASH_FLOW_STATEMENT.OPERATING_CASH_FLOW
+        capital_expenditure_key = Constants.CASH_FLOW_STATEMENT.CAPITAL_EXPENDITURE
+
         income_statement = financials[Constants.FINANCIALS.INCOME_STATEMENT]
         cash_flow_statement = financials[Constants.FINANCIALS.CASH_FLOW_STATEMENT]
 
-        metrics = []
-        for income_year, cash_flow_year in zip(income_statement["financials"], cash_flow_statement["financials"]):
-            date = income_year[Constants.INCOME_STATEMENT.DATE]
-            year = int(date.split("-")[0])
-
-            revenue = float(income_year[Constants.INCOME_STATEMENT.REVENUE])
-            net_income = float(income_year[Constants.INCOME_STATEMENT.NET_INCOME])
-            free_cash_flow = _calculate_free_cash_flow(cash_flow_year)
-
-            metrics.append({"year" : year, "revenue" : revenue, "net_income" : net_income, "free_cash_flow" : free_cash_flow })
+        # pair the statements by year rather than by position, only years found in both are used
+        income_by_year = {int(income_year[income_date_key][:4]): income_year for income_year in income_statement["financials"]}
+        cash_flow_by_year = {int(cash_flow_year[cash_flow_date_key][:4]): cash_flow_year for cash_flow_year in cash_flow_statement["financials"]}
 
         # ensure it is sorted in ascending order by year
-        metrics = sorted(metrics, key=lambda x : x["year"])
-        self.logger.debug(f"metrics -> {json.dumps(metrics, indent=2)}\n")
+        years = sorted(income_by_year.keys() & cash_flow_by_year.keys())
+
+        # the api returns numbers as strings. convert with float() rather than letting numpy do it on
+        # assignment, numpy silently turns a null into nan where float() raises
+        n = len(years)
+        revenue = np.empty(n, dtype=np.float64)
+        net_income = np.empty(n, dtype=np.float64)
+        operating_cash_flow = np.empty(n, dtype=np.float64)
+        capital_expenditure = np.empty(n, dtype=np.float64)
+        for i, year in enumerate(years):
+            income_year = income_by_year[year]
+            cash_flow_year = cash_flow_by_year[year]
+
+            revenue[i] = float(income_year[revenue_key])
+            net_income[i] = float(income_year[net_income_key])
+            operating_cash_flow[i] = float(cash_flow_year[operating_cash_flow_key])
+            capital_expenditure[i] = float(cash_flow_year[capital_expenditure_key])
+
+        # FCF = Cash Flow from Operations - Capex
+        free_cash_flow = operating_cash_flow - capital_expenditure
+
+        metrics = Metrics(years=np.asarray(years), revenue=revenue, net_income=net_income, free_cash_flow=free_cash_flow)
+        self.logger.debug("metrics -> %s\n", metrics)
 
         return metrics
 
-    def _calculate_free_cash_flow_rate(self, metrics):
+    def _calculate_rates(self, metrics):
         """
-        Calculates the free cash flow rate based on historical FCF and net income.
-        FCFR = FCF / Net Income
+        Calculates the free cash flow rate, revenue growth rate, and net income margins
+        percentage in one pass over the historical metrics. Each is chosen based on `self.risk`.
 
-        Parameters
-        ----------
-        metrics : array<dict>
-            An aggregation of revenue, net income, and free cash flow for all available data.
-            Array is sorted in ascending order by year
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
-
-        Returns
-        -------
-        float
-            free cash flow rate to be used
-        """
-        self.logger.debug("--- Step # 2 -> DiscountedCashFlowModel._calculate_free_cash_flow_rate ---")
-
-        ratios = [float(metric["free_cash_flow"] / metric["net_income"]) for metric in metrics]
-
-        # choose ratio to use based on risk arg
-        percentage = self._choose_percentage_based_on_risk(ratios)
-        self.logger.debug(f"percentage -> {percentage}\n")
-
-        return percentage
-
-    def _calculate_revenue_growth_rate(self, metrics):
-        """
-        Calculates the revenue growth rate to project future earnings. It is 
-        calculated based on `self.risk`.
-
-        Parameters
-        ----------
-        metrics : array<dict>
-            An aggregation of revenue, net income, and free cash flow for all available data.
-            Array is sorted in ascending order by year
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
-
-        Returns
-        -------
-        float
-            revenue growth rate percentage
-        """
-        self.logger.debug("--- Step # 3 -> DiscountedCashFlowModel._calculate_revenue_growth_rate ---")
-
-        percentage_changes = []
-        for i in range(1, len(metrics)):
-            curr_cash = metrics[i]["revenue"]
-            prev_cash = metrics[i - 1]["revenue"]
-            change = self._percentage_change(prev_cash, curr_cash)
-            percentage_changes.append(change)
-
-        # get our growth rate depending on our risk arg
-        percentage = self._choose_percentage_based_on_risk(percentage_changes)
-        self.logger.debug(f"percentage -> {percentage}\n")
-
-        return percentage
-
-    def _calculate_net_income_margins_percentage(self, metrics):
-        """
-        Calculates the net income margins in order to estimate future net income.
+        FCFR = FCF / Net Income
+        Revenue Growth = (Revenue(t) - Revenue(t - 1)) / Revenue(t - 1)
         Net Income Margins = Net Income / Revenue
 
         Parameters
         ----------
-        metrics : array<dict>
+        metrics : Metrics
             An aggregation of revenue, net income, and free cash flow for all available data.
-            Array is sorted in ascending order by year
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
+            Each field is an array sorted in ascending order by year
 
         Returns
         -------
-        float
-            Net Income Margin percentage chosen based on risk
+        float, float, float
+            free cash flow rate to be used, revenue growth rate percentage, and net income margin percentage
         """
-        self.logger.debug("--- Step # 4 -> DiscountedCashFlowModel._calculate_net_income_margins_percentage ---")
-
-        net_income_margin_percentages = [float(metric["net_income"] / metric["revenue"]) for metric in metrics]
-
-        # choose ratio to use based on risk arg
-        percentage = self._choose_percentage_based_on_risk(net_income_margin_percentages)
-        self.logger.debug(f"percentage -> {percentage}\n")
-
-        return percentage
+        self.logger.debug("--- Step # 2 -> DiscountedCashFlowModel._calculate_rates ---")
 
-    def _estimate_future_metrics(self, metrics, free_cash_flow_rate_percentage, revenue_growth_rate, net_income_margins_percentage):
-        """
-        Estimate future revenues, net income, and free cash flow.
-
-        Parameters
-        ----------
-        metrics : array<dict>
-            An aggregation of revenue, net income, and free cash flow for all available data.
-            Array is sorted in ascending order by year
+        revenue = metrics.revenue
+        net_income = metrics.net_income
 
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
+        # growth needs a previous year, otherwise numpy warns about an empty slice before failing
+        if revenue.size < 2:
+            raise Exception(f"Need at least 2 years of data to compute the revenue growth rate, found {revenue.size}.")
 
-        free_cash_flow_rate_percentage : float
-            rate used to estimate future free cash flow
+        # computed back to back so the columns are only pulled into cache once
+        free_cash_flow_rates = metrics.free_cash_flow / net_income
+        revenue_growth_rates = np.diff(revenue) / revenue[:-1]
+        net_income_margin_percentages = net_income / revenue
 
-        revenue_growth_rate : float
-            rate used to estimate future revenue
+        # choose percentages to use based on risk arg
+        free_cash_flow_rate_percentage = self._choose_percentage_based_on_risk(free_cash_flow_rates)
+        revenue_growth_rate = self._choose_percentage_based_on_risk(revenue_growth_rates)
+        net_income_margins_percentage = self._choose_percentage_based_on_risk(net_income_margin_percentages)
+        self.logger.debug("free_cash_flow_rate_percentage -> %s", free_cash_flow_rate_percentage)
+        self.logger.debug("revenue_growth_rate -> %s", revenue_growth_rate)
+        self.logger.debug("net_income_margins_percentage -> %s\n", net_income_margins_percentage)
 
-        net_income_margins_percentage : float
-            rate used to estimate future net income
+        return free_cash_flow_rate_percentage, revenue_growth_rate, net_income_margins_percentage
 
-        Returns
-        -------
-        array<dict>
-            An aggregation of FUTURE revenue, net income, and free cash flow.
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
+    def _calculate_today_value(self, last_revenue, free_cash_flow_rate_percentage, revenue_growth_rate, net_income_margins_percentage):
         """
-        def _calculate_future_revenue(metrics, revenue_growth_rate, years_to_project, apply_percentage):
-            """
-            Calculate the future revenue using the appropriate 
-            growth rate for `years_to_project` in the future.
-
-            Parameters
-            ----------
-            metrics : array<dict>
-                An aggregation of revenue, net income, and free cash flow for all available data.
-                Array is sorted in ascending order by year
-
-                structure of array:
-                [
-                    {
-                        "year": 2019,
-                        "revenue": 2000,
-                        "net_income": 1000,
-                        "free_cash_flow": 1500
-                    },
-                    ...
-                ]
-
-            revenue_growth_rate : float
-                rate used to estimate future revenue
-
-            years_to_project : int
-                number of years in the future to project to
-
-            apply_percentage : func
-                function will apply a percentage to the passed in number
-
-            Returns
-            -------
-            array<dict>
-                Future projected revenues
-
-                structure of array:
-                [
-                    {
-                        "year": 2019,
-                        "revenue": 2000
-                    },
-                    ...
-                ]
-            """
-            future_revenue = []
-
-            metric = metrics[-1]
-            year = metric["year"]
-            curr_revenue = metric["revenue"]
-            for future_year in range(year + 1, year + years_to_project + 1):
-                curr_revenue = apply_percentage(curr_revenue, revenue_growth_rate)
-                future_revenue.append({"year": future_year, "revenue": curr_revenue})
-
-            return future_revenue
-
-        def _calculate_future_net_income_and_free_cash_flow(future_revenue, free_cash_flow_rate_percentage, net_income_margins_percentage):
-            """
-            Calculates the future net income and free cash flow based off of future revenue.
-
-            Parameters
-            ----------
-            future_revenue : array<dict>
-                Future projected revenues
-
-                structure of array:
-                [
-                    {
-                        "year": 2019,
-                        "revenue": 2000
-                    },
-                    ...
-                ]
-
-            free_cash_flow_rate_percentage : float
-                rate used to estimate future free cash flow
-
-            net_income_margins_percentage : float
-                rate used to estimate future net income
-
-            Returns
-            -------
-            array<dict>
-                future metrics for revenue, net income, and free cash flow
-
-                structure of array:
-                [
-                    {
-                        "year": 2019,
-                        "revenue": 2000,
-                        "net_income": 1000,
-                        "free_cash_flow": 1500
-                    },
-                    ...
-                ]
-            """
-            future_metrics = []
-            for i, estimate in enumerate(future_revenue):
-                future_year = estimate["year"]
-                future_revenue = estimate["revenue"]
-
-                future_net_income = future_revenue * net_income_margins_percentage
-                future_free_cash_flow = future_net_income * free_cash_flow_rate_percentage
-
-                estimate["net_income"] = future_net_income
-                estimate["free_cash_flow"] = future_free_cash_flow
-
-                future_metrics.append(estimate)
-
-            return future_metrics
-
-        self.logger.debug("--- Step # 5 -> DiscountedCashFlowModel._estimate_future_metrics ---")
-
-        # get future revenues
-        future_revenue = _calculate_future_revenue(metrics, revenue_growth_rate, self.years_to_project, self._add_percentage)
-        self.logger.debug(f"future_revenue -> {json.dumps(future_revenue, indent=2)}\n")
-
-        # from future revenues, calculate future net income / free cash flow
-        future_metrics = _calculate_future_net_income_and_free_cash_flow(future_revenue, free_cash_flow_rate_percentage, net_income_margins_percentage)
-        self.logger.debug(f"future_metrics -> {json.dumps(future_metrics, indent=2)}\n")
-
-        return future_metrics
-
-    def _calculate_terminal_value(self, last_future_metric):
-        """
-        Calculate the terminal value based on the last future estimated
-        free cash flow.
-
-        TV = (FCF * (1 + g)) / (r - g), where
-        FCF = last estimated free cash flow, 
-        g = perpetual growth rate, 
-        r = required rate of return
+        Calculate today's value for each company. Future free cash flow is estimated from
+        the last year of revenue, then each future cash flow and the terminal value are
+        discounted and summed up. See `_project_and_discount`.
 
         Parameters
         ----------
-        last_future_metric : dict
-            dictionary containing the future year, revenue, net income, and free cash flow
-
-            structure of dict:
-            {
-                "year": 2019,
-                "revenue": 2000,
-                "net_income": 1000,
-                "free_cash_flow": 1500
-            }
-
-        Returns
-        -------
-        float
-            the terminal value based off of the last free cash flow
-        """
-        self.logger.debug("--- Step # 6 -> DiscountedCashFlowModel._calculate_terminal_value ---")
+        last_revenue : np.ndarray
+            revenue of the most recent historical year, one per company
 
-        fcf = last_future_metric["free_cash_flow"]
-        g = float(self.perpetual_growth_rate / 100)
-        r = float(self.required_rate_of_return / 100)
+        free_cash_flow_rate_percentage : np.ndarray
+            rate used to estimate future free cash flow, one per company
 
-        terminal_value = (fcf * (1 + g)) / (r - g)
-        self.logger.debug(f"terminal_value -> {terminal_value}\n")
+        revenue_growth_rate : np.ndarray
+            rate used to estimate future revenue, one per company
 
-        return terminal_value
-            
-    def _calculate_today_value(self, future_metrics, terminal_value):
-        """
-        Calculate today's value for the company. We must apply a discount factor
-        for each future cash flow, then sum up all present value of future cash flow.
-
-        DF = (1 + r) ^ t, where
-        r = required rate of return
-        t = year in the future -> 1 <= t <= `self.years_to_project`
-
-        PV = FCF / DF
-
-        Parameters
-        ----------
-        future_metrics : array<dict>
-            An aggregation of FUTURE revenue, net income, and free cash flow.
-
-            structure of array:
-            [
-                {
-                    "year": 2019,
-                    "revenue": 2000,
-                    "net_income": 1000,
-                    "free_cash_flow": 1500
-                },
-                ...
-            ]
-
-        terminal_value : float
-            terminal value based on last future free cash flow
+        net_income_margins_percentage : np.ndarray
+            rate used to estimate future net income, one per company
 
         Returns
         -------
-        float
-            today's total value for the company, i.e. market cap
+        np.ndarray
+            today's total value for each company, i.e. market cap
         """
-        def _present_value(fcf, r, t):
-            """
-            Calculates the present value of free cash flow.
-
-            Parameters
-            ----------
-            fcf : float
-                free cash flow
-            r : float
-                required rate of return
-            t : int
-                time
-
-            Returns
-            -------
-            float
-                present value
-            """
-            def _discount_factor(r, t):
-                """
-                Calculates the discount factor.
-
-                Parameters
-                ----------
-                r : float
-                    required rate of return
-                t : float
-                    time
-
-                Returns
-                -------
-                float
-                    discount factor
-                """
-                return (1 + r) ** t
-            return fcf / _discount_factor(r, t)
-
-        self.logger.debug("--- Step # 7 -> DiscountedCashFlowModel._calculate_today_value ---")
-
-        r = float(self.required_rate_of_return / 100)
-
-        # must sum our future estimates AND terminal value discounted
-        present_values_future_fcf = sum([_present_value(metric["free_cash_flow"], r, i + 1) for i, metric in enumerate(future_metrics)])
-        present_value_terminal = _present_value(terminal_value, r, len(future_metrics))
-
-        # return today's value
-        today_value = present_values_future_fcf + present_value_terminal
-        self.logger.debug(f"today_value -> {today_value}\n")
+        self.logger.debug("--- Step # 3 -> DiscountedCashFlowModel._calculate_today_value ---")
+
+        today_value, terminal_value = _project_and_discount(
+            last_revenue,
+            revenue_growth_rate,
+            net_income_margins_percentage,
+            free_cash_flow_rate_percentage,
+            self._r,
+            self._tv_numerator_mult / self._tv_denominator,
+            self.years_to_project
+        )
+        self.logger.debug("terminal_value -> %s", terminal_value)
+        self.logger.debug("today_value -> %s\n", today_value)
 
         return today_value
 
     def _calculate_fair_value(self, quotes, today_value):
         """
-        Calculates the fair value for the company.
-        FV = shares / value
+        Calculates the fair value for each company.
+        FV = value / shares
 
         Parameters
         ----------
-        quotes : array<dict> of size 1
-            dictionary holding all quote data for the ticker symbol. For some reason,
-            the api returns an array always of size 1.
+        quotes : array<array<dict>>
+            quote data for each company. For some reason, the api returns an array
+            always of size 1 per company.
 
             structure of dict can be found in `financial_modeling_api.constants.Constants.QUOTES`
 
+        today_value : np.ndarray
+            today's total value for each company
+
         Returns
         -------
-        float
-            fair value for the company
+        np.ndarray
+            fair value for each company
         """
-        self.logger.debug("--- Step # 8 -> DiscountedCashFlowModel._calculate_fair_value ---")
+        self.logger.debug("--- Step # 4 -> DiscountedCashFlowModel._calculate_fair_value ---")
 
-        shares_outstanding = quotes[0][Constants.QUOTES.SHARES_OUTSTANDING]
+        shares_outstanding = np.fromiter((quote[0][Constants.QUOTES.SHARES_OUTSTANDING] for quote in quotes), dtype=np.float64, count=len(quotes))
         fair_value = today_value / shares_outstanding
 
-        self.logger.debug(f"fair_value -> {fair_value}\n")
+        self.logger.debug("fair_value -> %s\n", fair_value)
 
         return fair_value
 
@@ -590,19 +391,18 @@ class DiscountedCashFlowModel:
 
         Parameters
         ----------
-        fair_value : float
-            fair value of the company
+        fair_value : np.ndarray
+            fair value of each company
 
         Returns
         -------
-        float
+        np.ndarray
             fair value accounted by the margin of safety
         """
-        self.logger.debug("--- Step # 9 -> DiscountedCashFlowModel._apply_margin_of_safety ---")
+        self.logger.debug("--- Step # 5 -> DiscountedCashFlowModel._apply_margin_of_safety ---")
 
-        margin_of_safety = float(self.margin_of_safety / 100)
-        fair_value_with_margin_of_safety = self._subtract_percentage(fair_value, margin_of_safety)
-        self.logger.debug(f"fair_value_with_margin_of_safety -> {fair_value_with_margin_of_safety}\n")
+        fair_value_with_margin_of_safety = fair_value * self._mos_mul
+        self.logger.debug("fair_value_with_margin_of_safety -> %s\n", fair_value_with_margin_of_safety)
 
         return fair_value_with_margin_of_safety
 
@@ -616,7 +416,7 @@ class DiscountedCashFlowModel:
 
         Parameters
         ----------
-        percentages : array<float>
+        percentages : np.ndarray
             array representing percentages
         
         Returns
@@ -624,68 +424,4 @@ class DiscountedCashFlowModel:
         float
             percentage to be used for calculation from caller
         """
-        if self.risk == Risk.CONSERVATIVE:
-            # grab the minimum percentage change
-            return min(percentages)
-        elif self.risk == Risk.MODERATE:
-            # calculate the average of the percentages
-            return sum(percentages) / len(percentages)
-        else:
-            # bullish estimate requires the maximum percentage change
-            return max(percentages)
-
-    def _add_percentage(self, num, percentage):
-        """
-        Adds the percentage change to the original number.
-
-        Parameters
-        ----------
-        num : float
-            number to be added to the percentage change
-
-        percentage : float
-            float value to be applied to the number
-
-        Returns
-        -------
-        float
-            added percentage change of `num`
-        """
-        return float(num + (num * percentage))
-
-    def _subtract_percentage(self, num, percentage):
-        """
-        Subtracts the percentage change to the original number.
-
-        Parameters
-        ----------
-        num : float
-            number to be subtracted to the percentage change
-
-        percentage : float
-            float value to be applied to the number
-
-        Returns
-        -------
-        float
-            subtracted percentage change of `num`
-        """
-        return (num - (num * percentage))
-
-    def _percentage_change(self, old, new):
-        """
-        Calculates the percentage change between two numbers.
-
-        Parameters
-        ----------
-        old : float
-            original number
-        new : float
-            new number
-        
-        Returns
-        -------
-        float
-            percentage change from `old` to `new`
-        """
-        return float((new - old) / old)
+        return self._reduce(percentages)
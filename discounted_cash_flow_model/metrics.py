@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass
+class Metrics:
+    years: np.ndarray
+    revenue: np.ndarray
+    net_income: np.ndarray
+    free_cash_flow: np.ndarray
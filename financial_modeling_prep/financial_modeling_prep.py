@@ -1,11 +1,171 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import requests
 import json
 
+# below DEBUG, enables logging the full api payloads
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+def _has_data(value):
+    """
+    Determines if an api call returned usable data. The api answers unknown symbols,
+    rejected keys, and rate limiting with an error body rather than an error status,
+    e.g. `{"Error Message": "Limit Reach"}`, so a successful call is not enough.
+
+    Parameters
+    ----------
+    value : (dict or array<dict>, Exception)
+        response and error as returned by `_call_api`
+
+    Returns
+    -------
+    bool
+        true if the call succeeded and holds statement rows or quotes, false otherwise
+    """
+    response, err = value
+    if err is not None:
+        return False
+    if isinstance(response, dict):
+        return bool(response.get("financials"))
+
+    return isinstance(response, list) and len(response) > 0
+
+def _ttl_cache(endpoint, ttl_attr="cache_ttl", persist=False):
+    """
+    Caches the response of an api getter in memory for `self.<ttl_attr>` seconds.
+
+    Responses are keyed by `(endpoint, symbol, *args)` and stored as `(expires_at, value)`.
+    Failed api calls and error bodies are never cached. Concurrent misses on the same key wait for
+    the first caller's fetch instead of all hitting the api.
+
+    Parameters
+    ----------
+    endpoint : str
+        name of the endpoint being wrapped, used as part of the cache key
+
+    ttl_attr : str
+        name of the instance attribute holding the time to live in seconds
+
+    persist : bool
+        if true and `self.cache_dir` is set, responses are also kept on disk for
+        `self.disk_cache_ttl` seconds so they survive between runs. once expired, the
+        stored ETag / Last-Modified are sent along and a 304 reuses the stored response.
+        the getter must then accept a `validators` keyword argument, see `_call_api`
+
+    Returns
+    -------
+    func
+        decorator to be applied to a getter taking a ticker symbol and optionally other
+        positional arguments, e.g. a row limit
+    """
+    def decorator(fetch):
+        def _fetch_with_disk_cache(self, key, symbol, args):
+            cached = self._read_disk_cache(key)
+            if cached is not None and cached[2]:
+                return cached[0], None
+
+            # ask the api to only send the body if it changed since the stored copy
+            validators = dict(cached[1]) if cached is not None else {}
+            value = fetch(self, symbol, *args, validators=validators)
+
+            if cached is not None and validators.get("not_modified"):
+                self.logger.debug("disk cache revalidated -> %s", key)
+                self._touch_disk_cache(key)
+                return cached[0], None
+
+            if _has_data(value):
+                self._write_disk_cache(key, value[0], validators)
+
+            return value
+
+        @functools.wraps(fetch)
+        def wrapper(self, symbol, *args):
+            # upper case once here, the getters build their urls from the normalized symbol
+            symbol = symbol.upper()
+            key = (endpoint, symbol, *args)
+
+            def _lookup():
+                with self._cache_lock:
+                    entry = self._cache.get(key)
+                if entry is not None and entry[0] > time.monotonic():
+                    self.logger.debug("cache hit -> %s", key)
+                    return entry[1]
+                return None
+
+            value = _lookup()
+            if value is not None:
+                return value
+
+            with self._cache_lock:
+                key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+            with key_lock:
+                # another thread may have fetched it while we were waiting
+                value = _lookup()
+                if value is not None:
+                    return value
+
+                if persist:
+                    value = _fetch_with_disk_cache(self, key, symbol, args)
+                else:
+                    value = fetch(self, symbol, *args)
+
+                if _has_data(value):
+                    with self._cache_lock:
+                        self._cache[key] = (time.monotonic() + getattr(self, ttl_attr), value)
+
+            return value
+        return wrapper
+    return decorator
+
 class FinancialModelingPrep:
-    def __init__(self, logger):
+    def __init__(self, logger, cache_ttl=86400, quote_cache_ttl=5, cache_dir=None, disk_cache_ttl=86400, max_connections=16, timeout=(3.05, 10), max_requests_per_minute=300):
         self.base_url = "https://financialmodelingprep.com"
         self.logger = logger
 
+        # endpoint prefixes are constant, build them once rather than on every request
+        self._v3 = f"{self.base_url}/api/v3/"
+        self._financials_url = f"{self._v3}financials/"
+        self.cache_ttl = cache_ttl
+        self.quote_cache_ttl = quote_cache_ttl
+        self.cache_dir = cache_dir
+        self.disk_cache_ttl = disk_cache_ttl
+        # (connect, read) in seconds, a stalled server can't hang a worker thread forever
+        self.timeout = timeout
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._key_locks = {}
+
+        # send times of the last `max_requests_per_minute` requests, a sliding window keeping
+        # the request rate under the api's per minute limit. None disables it
+        self.max_requests_per_minute = max_requests_per_minute
+        self._rate_lock = threading.Lock()
+        self._sent_at = deque(maxlen=max_requests_per_minute or None)
+
+        # one session shared by every request so keep-alive connections (and their TLS handshake)
+        # are reused across endpoints and tickers. when every connection is busy, callers wait for
+        # one to free up rather than opening extra connections that get thrown away. rate limited and
+        # transient server errors are retried with an exponential backoff, honoring Retry-After
+        retry = Retry(total=4, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(["GET"]))
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections, pool_block=True, max_retries=retry))
+
+    def close(self):
+        """
+        Closes the pooled connections held by the session.
+        """
+        self._session.close()
+
     def get_quotes(self, symbol):
         """
         Fetches quote data for a company.
@@ -25,15 +185,13 @@ class FinancialModelingPrep:
         """
         self.logger.debug("--- FinancialModelingPrep.get_quotes ---")
 
-        url = f"{self._version()}quote/{symbol.upper()}"
-
-        self.logger.debug(f"url -> {url}")
-
-        quote_response, err = self._call_api(url)
+        quote_response, err = self._get_quotes(symbol)
         if err:
             raise Exception(f"Failed to fetch quote data for ticker symbol {symbol}.")
 
-        self.logger.debug(f"quote_response -> {json.dumps(quote_response, indent=2)}\n")
+        self.logger.debug("quote_response -> symbol=%s rows=%d", symbol.upper(), len(quote_response))
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, "quote_response -> %s\n", json.dumps(quote_response, indent=2))
 
         return quote_response
 
@@ -61,39 +219,16 @@ class FinancialModelingPrep:
                 "cash_flow_statement: {...}
             }
         """
-        def _has_more_than_minimum(minimum_years, data):
+        def _validate_and_trim(minimum_years, maximum_years, data):
             """
-            Determines if we have enough data to perform DCF calculation.
+            Determines if we have enough data to perform DCF calculation and
+            cuts the data to the maximum amount of years specified.
 
             Parameters
             ----------
             minimum_years : int
                 minimum amount of years of data needed
-            data : dict
-                financial data
-
-                structure of data:
-                {
-                    "symbol": "XYZ",
-                    "financials": [
-                        {...},
-                        ...
-                    ]
-                }
-            
-            Returns
-            -------
-            bool
-                true if we have enough data, false otherwise
-            """
-            return len(data["financials"]) >= minimum_years
-        
-        def _cut_data_to_maximum_years(maximum_years, data):
-            """
-            Cuts the data to the maximum amount of years specified.
 
-            Parameters
-            ----------
             maximum_years : int
                 max years of historical data to use
 
@@ -112,7 +247,7 @@ class FinancialModelingPrep:
             Returns
             -------
             dict
-                data input modified
+                copy of the data input with the financials cut, None if there is not enough data
 
                 structure of dict:
                 {
@@ -124,94 +259,274 @@ class FinancialModelingPrep:
                 }
             """
             financials = data["financials"]
-            cut_financials = financials[:maximum_years] if maximum_years < len(financials) else financials
-            data["financials"] = cut_financials
-            return data
+            if len(financials) < minimum_years:
+                return None
+
+            # copy rather than mutate, `data` may be shared with the response cache
+            return {**data, "financials": financials[:maximum_years]}
 
         self.logger.debug("--- FinancialModelingPrep.get_financials ---")
 
         financials = {}
 
-        income_statement_response, income_err = self._get_income_statement(symbol)
+        # only ask the api for the years we can use, anything past the maximum would be cut anyway
+        limit = max(minimum_years, maximum_years)
+
+        # the three statements are independent, so fetch them concurrently
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            income_statement_future = executor.submit(self._get_income_statement, symbol, limit)
+            balance_sheet_future = executor.submit(self._get_balance_sheet, symbol, limit)
+            cash_flow_statement_future = executor.submit(self._get_cash_flow_statement, symbol, limit)
+
+        income_statement_response, income_err = income_statement_future.result()
         if income_err:
             raise Exception(f"Failed to fetch income statement for ticker symbol {symbol}.")
-        if not _has_more_than_minimum(minimum_years, income_statement_response):
+        financials["income_statement"] = _validate_and_trim(minimum_years, maximum_years, income_statement_response)
+        if financials["income_statement"] is None:
             raise Exception(f"Not enough data found in the income statement for ticker symbol {symbol}.")
-        financials["income_statement"] = _cut_data_to_maximum_years(maximum_years, income_statement_response)
         
-        self.logger.debug(f"income_statement_response -> {json.dumps(financials['income_statement'], indent=2)}\n")
+        self.logger.debug("income_statement_response -> symbol=%s rows=%d", financials["income_statement"].get("symbol"), len(financials["income_statement"]["financials"]))
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, "income_statement_response -> %s\n", json.dumps(financials["income_statement"], indent=2))
 
-        balance_sheet_response, balance_err = self._get_balance_sheet(symbol)
+        balance_sheet_response, balance_err = balance_sheet_future.result()
         if balance_err:
             raise Exception(f"Failed to fetch balance sheet for ticker symbol {symbol}")
-        if not _has_more_than_minimum(minimum_years, balance_sheet_response):
+        financials["balance_sheet"] = _validate_and_trim(minimum_years, maximum_years, balance_sheet_response)
+        if financials["balance_sheet"] is None:
             raise Exception(f"Not enough data found in the balance sheet for ticker symbol {symbol}.")
-        financials["balance_sheet"] = _cut_data_to_maximum_years(maximum_years, balance_sheet_response)
 
-        self.logger.debug(f"balance_sheet_response -> {json.dumps(financials['balance_sheet'], indent=2)}\n")
+        self.logger.debug("balance_sheet_response -> symbol=%s rows=%d", financials["balance_sheet"].get("symbol"), len(financials["balance_sheet"]["financials"]))
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, "balance_sheet_response -> %s\n", json.dumps(financials["balance_sheet"], indent=2))
 
-        cash_flow_statement_response, cash_flow_err = self._get_cash_flow_statement(symbol)
+        cash_flow_statement_response, cash_flow_err = cash_flow_statement_future.result()
         if cash_flow_err:
             raise Exception(f"Failed to fetch cash flow statement for ticker symbol {symbol}")
-        if not _has_more_than_minimum(minimum_years, cash_flow_statement_response):
+        financials["cash_flow_statement"] = _validate_and_trim(minimum_years, maximum_years, cash_flow_statement_response)
+        if financials["cash_flow_statement"] is None:
             raise Exception(f"Not enough data found in the cash flow statement for ticker symbol {symbol}.")
-        financials["cash_flow_statement"] = _cut_data_to_maximum_years(maximum_years, cash_flow_statement_response)
 
-        self.logger.debug(f"cash_flow_statement_response -> {json.dumps(financials['cash_flow_statement'], indent=2)}\n")
+        self.logger.debug("cash_flow_statement_response -> symbol=%s rows=%d", financials["cash_flow_statement"].get("symbol"), len(financials["cash_flow_statement"]["financials"]))
+        if self.logger.isEnabledFor(TRACE):
+            self.logger.log(TRACE, "cash_flow_statement_response -> %s\n", json.dumps(financials["cash_flow_statement"], indent=2))
 
         return financials
 
-    def _version(self):
+    def _wait_for_rate_limit(self):
+        """
+        Blocks until a request can be sent without going over `self.max_requests_per_minute`.
+        No 60 second window ever holds more than that many requests, the first
+        `self.max_requests_per_minute` are sent right away and every later request waits
+        until a minute has passed since the request that many places before it.
+        """
+        if not self.max_requests_per_minute:
+            return
+
+        with self._rate_lock:
+            now = time.monotonic()
+
+            # reserve a send time even if it is in the future, so callers queue up in order
+            send_at = now
+            if len(self._sent_at) == self.max_requests_per_minute:
+                send_at = max(now, self._sent_at[0] + 60.0)
+            self._sent_at.append(send_at)
+            wait = send_at - now
+
+        if wait > 0:
+            self.logger.debug("rate limited, waiting %s seconds", wait)
+            time.sleep(wait)
+
+    def _call_api(self, url, validators=None):
         """
-        Combines the `self.base_url` with the API version.
+        Performs a GET request using the shared requests session.
+
+        Parameters
+        ----------
+        url : str
+            url to be called
+
+        validators : dict
+            optional, makes the request conditional. "etag" and "last_modified" are sent as
+            If-None-Match / If-Modified-Since and replaced with the values the api answers
+            with. on a 304, "not_modified" is set to true and the response is None
 
         Returns
         -------
-        str
-            base url + api version
+        dict, Exception
+            dict represents the json response coming from the api call. if there is an error, this will be None.
+            Exception is an error object where if the api call is successful, this will be none
         """
-        return self.base_url + "/api/v3/"
+        self._wait_for_rate_limit()
+
+        headers = None
+        if validators is not None:
+            headers = {}
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            response = self._session.get(url, headers=headers, timeout=self.timeout)
 
-    def _financials(self):
+            if validators is not None:
+                if response.status_code == 304:
+                    validators["not_modified"] = True
+                    return None, None
+
+                validators["etag"] = response.headers.get("ETag")
+                validators["last_modified"] = response.headers.get("Last-Modified")
+
+            # decode the raw bytes, `response.json()` first builds `response.text`, which may run
+            # charset detection over the whole body. json.loads detects utf-8/16/32 from the bytes
+            return json.loads(response.content), None
+        except Exception as e:
+            return None, e
+
+    def _disk_cache_path(self, key):
         """
-        Combines the `self._version` with financials.
+        Builds the file path used to persist a cached response.
+
+        Parameters
+        ----------
+        key : tuple
+            endpoint, upper cased ticker symbol, and any other getter arguments
 
         Returns
         -------
         str
-            base url + version + financials
+            `self.cache_dir`/endpoint/symbol[-arg...].json
         """
-        return self._version() + "/financials/"
+        endpoint, *parts = key
+        file_name = "-".join(quote(str(part), safe="") for part in parts)
+        return os.path.join(self.cache_dir, endpoint, f"{file_name}.json")
 
-    def _call_api(self, url):
+    def _read_disk_cache(self, key):
         """
-        Performs a GET request using the requests module.
+        Reads a persisted response if the disk cache is enabled.
 
         Parameters
         ----------
-        url : str
-            url to be called
+        key : tuple
+            endpoint, upper cased ticker symbol, and any other getter arguments
 
         Returns
         -------
-        dict, Exception
-            dict represents the json response coming from the api call. if there is an error, this will be None.
-            Exception is an error object where if the api call is successful, this will be none
+        (dict, dict, bool) or None
+            the cached response, its "etag" / "last_modified" validators, and whether the
+            response is younger than `self.disk_cache_ttl` seconds. None on a miss
         """
+        if not self.cache_dir:
+            return None
+
+        path = self._disk_cache_path(key)
         try:
-            response = requests.get(url)
-            return response.json(), None
-        except Exception as e:
-            return None, e
+            fresh = time.time() - os.path.getmtime(path) < self.disk_cache_ttl
+            with open(path, "r") as f:
+                entry = json.load(f)
+            response = entry["response"]
+            validators = {"etag": entry.get("etag"), "last_modified": entry.get("last_modified")}
+        except (OSError, ValueError, KeyError, TypeError):
+            # a missing, unreadable, or old format cache file is just a miss
+            return None
+
+        if fresh:
+            self.logger.debug("disk cache hit -> %s", path)
+
+        return response, validators, fresh
+
+    def _write_disk_cache(self, key, response, validators):
+        """
+        Persists a response if the disk cache is enabled. Failing to write is logged
+        and otherwise ignored, the cache is only an optimization.
+
+        Parameters
+        ----------
+        key : tuple
+            endpoint, upper cased ticker symbol, and any other getter arguments
+
+        response : dict
+            json response coming from the api call
 
-    def _get_income_statement(self, symbol):
+        validators : dict
+            "etag" and "last_modified" the api answered with, used to revalidate the
+            response once it expires
+        """
+        if not self.cache_dir:
+            return
+
+        path = self._disk_cache_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # write to a uniquely named temporary file first so concurrent readers never see a partial
+            # response, and concurrent writers, from this or another process, never share a file
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"etag": validators.get("etag"), "last_modified": validators.get("last_modified"), "response": response}, f)
+                os.replace(temp_path, path)
+            except OSError:
+                os.remove(temp_path)
+                raise
+        except OSError as e:
+            self.logger.debug("failed to write disk cache %s -> %s", path, e)
+
+    def _touch_disk_cache(self, key):
+        """
+        Restarts the time to live of a persisted response after the api confirmed
+        it has not changed.
+
+        Parameters
+        ----------
+        key : tuple
+            endpoint, upper cased ticker symbol, and any other getter arguments
+        """
+        path = self._disk_cache_path(key)
+        try:
+            os.utime(path)
+        except OSError as e:
+            self.logger.debug("failed to touch disk cache %s -> %s", path, e)
+
+    @_ttl_cache("quote", ttl_attr="quote_cache_ttl")
+    def _get_quotes(self, symbol):
+        """
+        Makes a GET request for the quote data using the ticker symbol.
+
+        Parameters
+        ----------
+        symbol : str
+            upper cased ticker symbol
+
+        Returns
+        -------
+        array<dict>, Exception
+            array represents the json response coming from the api call. if there is an error, this will be None.
+            Exception is an error object where if the api call is successful, this will be none
+        """
+        self.logger.debug("--- FinancialModelingPrep._get_quotes ---")
+
+        url = f"{self._v3}quote/{symbol}"
+        self.logger.debug("url -> %s", url)
+
+        return self._call_api(url)
+
+    @_ttl_cache("income-statement", persist=True)
+    def _get_income_statement(self, symbol, limit, validators=None):
         """
         Makes a GET request for the income statement using the ticker symbol.
 
         Parameters
         ----------
         symbol : str
-            ticker symbol
+            upper cased ticker symbol
+
+        limit : int
+            maximum amount of years the api should return
+
+        validators : dict
+            optional, makes the request conditional, see `_call_api`
 
         Returns
         -------
@@ -221,19 +536,26 @@ class FinancialModelingPrep:
         """
         self.logger.debug("--- FinancialModelingPrep._get_income_statement ---")
 
-        url = f"{self._financials()}income-statement/{symbol.upper()}"
-        self.logger.debug(f"url -> {url}")
+        url = f"{self._financials_url}income-statement/{symbol}?limit={limit}"
+        self.logger.debug("url -> %s", url)
 
-        return self._call_api(url)
+        return self._call_api(url, validators)
 
-    def _get_balance_sheet(self, symbol):
+    @_ttl_cache("balance-sheet-statement", persist=True)
+    def _get_balance_sheet(self, symbol, limit, validators=None):
         """
         Makes a GET request for the balance sheet statement using the ticker symbol.
 
         Parameters
         ----------
         symbol : str
-            ticker symbol
+            upper cased ticker symbol
+
+        limit : int
+            maximum amount of years the api should return
+
+        validators : dict
+            optional, makes the request conditional, see `_call_api`
 
         Returns
         -------
@@ -243,19 +565,26 @@ class FinancialModelingPrep:
         """
         self.logger.debug("--- FinancialModelingPrep._get_balance_sheet ---")
 
-        url = f"{self._financials()}balance-sheet-statement/{symbol.upper()}"
-        self.logger.debug(f"url -> {url}")
+        url = f"{self._financials_url}balance-sheet-statement/{symbol}?limit={limit}"
+        self.logger.debug("url -> %s", url)
 
-        return self._call_api(url)
+        return self._call_api(url, validators)
 
-    def _get_cash_flow_statement(self, symbol):
+    @_ttl_cache("cash-flow-statement", persist=True)
+    def _get_cash_flow_statement(self, symbol, limit, validators=None):
         """
         Makes a GET request for the cash flow statement using the ticker symbol.
 
         Parameters
         ----------
         symbol : str
-            ticker symbol
+            upper cased ticker symbol
+
+        limit : int
+            maximum amount of years the api should return
+
+        validators : dict
+            optional, makes the request conditional, see `_call_api`
 
         Returns
         -------
@@ -265,8 +594,8 @@ class FinancialModelingPrep:
         """
         self.logger.debug("--- FinancialModelingPrep._get_cash_flow_statement ---")
 
-        url = f"{self._financials()}cash-flow-statement/{symbol.upper()}"
-        self.logger.debug(f"url -> {url}")
+        url = f"{self._financials_url}cash-flow-statement/{symbol}?limit={limit}"
+        self.logger.debug("url -> %s", url)
 
-        return self._call_api(url)
+        return self._call_api(url, validators)
 
@@ -1,29 +1,33 @@
 from discounted_cash_flow_model.discounted_cash_flow_model import DiscountedCashFlowModel
-from financial_modeling_prep.financial_modeling_prep import FinancialModelingPrep
+from financial_modeling_prep.financial_modeling_prep import FinancialModelingPrep, TRACE
+from concurrent.futures import ThreadPoolExecutor
 import argparse
+import contextlib
+import functools
 import logging
+import os
 import sys
 
-class IntegerAction(argparse.Action):
-    def __call__(self, parser, namespace, values, option_string=None):
-        if values < 1:
-            parser.error(f"{option_string} must be greater than or equal to 1.")
-        
-        setattr(namespace, self.dest, values)
+def _positive_int(v):
+    try:
+        value = int(v)
+    except ValueError:
+        # argparse would otherwise report this helper's name instead of the type
+        raise argparse.ArgumentTypeError(f"invalid int value: {v!r}")
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be greater than or equal to 1.")
 
-class FloatAction(argparse.Action):
-    def __call__(self, parser, namespace, values, option_string=None):
-        if values < 0:
-            parser.error(f"{option_string} must be greater than 0.")
-        
-        setattr(namespace, self.dest, values)
+    return value
 
-class RiskAction(argparse.Action):
-    def __call__(self, parser, namespace, values, option_string=None):
-        if values not in ["conservative", "moderate", "bullish"]:
-            parser.error(f"{option_string} must be 1 of the 3 following options...\n1. conservative\n2. moderate\n3. bullish")
+def _non_negative_float(v):
+    try:
+        value = float(v)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid float value: {v!r}")
+    if value < 0:
+        raise argparse.ArgumentTypeError("must be greater than 0.")
 
-        setattr(namespace, self.dest, values)
+    return value
 
 def _configure_logger(debug):
     logger = logging.getLogger("LOGGER")
@@ -33,7 +37,10 @@ def _configure_logger(debug):
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
-    logger.setLevel(logging.DEBUG if debug else logging.INFO)
+    if debug == "trace":
+        logger.setLevel(TRACE)
+    else:
+        logger.setLevel(logging.DEBUG if debug else logging.INFO)
 
     return logger
 
@@ -47,17 +54,53 @@ def _str_to_bool(v):
     else:
         raise argparse.ArgumentTypeError('Boolean value expected.')
 
+def _debug_option(v):
+    # `trace` also logs the full api payloads, anything else is read as a boolean
+    if isinstance(v, str) and v.lower() == 'trace':
+        return 'trace'
+
+    return _str_to_bool(v)
+
+def _analyze(api, model, minimum_years, maximum_years, tick):
+    # runs on a worker thread, so output is buffered and printed by the caller in ticker order
+    lines = [f"Analyzing ticker symbol {tick}..."]
+
+    try:
+        # quotes don't depend on the statements, so request them while the statements are in flight
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            quotes_future = executor.submit(api.get_quotes, tick)
+
+            lines.append("Fetching financial statements...")
+            financials = api.get_financials(tick, minimum_years, maximum_years)
+
+            lines.append("Fetching quote data...")
+            quotes = quotes_future.result()
+    except Exception as e:
+        lines.append(f"Failed to fetch data from api -> {e}")
+        return lines, False
+
+    try:
+        lines.append("Calculating DCF...")
+        fair_value, fair_value_with_margin_of_safety = model.calculate(tick, financials, quotes)
+        lines.append(f"Fair value -> ${round(fair_value, 2)}\nFair value w/ margin of safety -> ${round(fair_value_with_margin_of_safety, 2)}\n")
+    except Exception as e:
+        lines.append(f"Failed to use DCF model -> {e}")
+
+    return lines, True
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Use the DCF model to calculate fair value for various companies.')
     parser.add_argument('--ticks', nargs='+', help='Specify ticker symbols (1 or more).', required=True)
-    parser.add_argument('--minimum_years', action=IntegerAction, help='Specify the minimum amount of years of data points needed to perform the DCF calculation.', type=int, default=4)
-    parser.add_argument('--maximum_years', action=IntegerAction, help='Specify the maximum amount of years of data points needed to perform the DCF calculation.', type=int, default=10)
-    parser.add_argument('--years_to_project', action=IntegerAction, help='Specify the number of years to project future earnings.', type=int, default=4)
-    parser.add_argument('--return_percentage', action=FloatAction, help='Specify the required rate of return in terms of a percentage.', type=float, default=8.0)
-    parser.add_argument('--perpetual_growth_rate', action=FloatAction, help='Perpetual growth rate is the rate at which the free cash flow will grow forever. This number will drastically change the fair value, thus the default is the growth rate of GDP.', type=float, default=2.5)
-    parser.add_argument('--margin_of_safety', action=FloatAction, help='Specify the margin of safety in terms of a percentage to be applied after the fair value is calculated.', type=float, default=50.0)
-    parser.add_argument('--risk', action=RiskAction, help='Specify the level of risk you would like to take. Choose between `conservative`, `moderate`, or `bullish`.', default='conservative')
-    parser.add_argument('--debug', help="Enable debug option.", type=_str_to_bool, default=False)
+    parser.add_argument('--minimum_years', help='Specify the minimum amount of years of data points needed to perform the DCF calculation.', type=_positive_int, default=4)
+    parser.add_argument('--maximum_years', help='Specify the maximum amount of years of data points needed to perform the DCF calculation.', type=_positive_int, default=10)
+    parser.add_argument('--years_to_project', help='Specify the number of years to project future earnings.', type=_positive_int, default=4)
+    parser.add_argument('--return_percentage', help='Specify the required rate of return in terms of a percentage.', type=_non_negative_float, default=8.0)
+    parser.add_argument('--perpetual_growth_rate', help='Perpetual growth rate is the rate at which the free cash flow will grow forever. This number will drastically change the fair value, thus the default is the growth rate of GDP.', type=_non_negative_float, default=2.5)
+    parser.add_argument('--margin_of_safety', help='Specify the margin of safety in terms of a percentage to be applied after the fair value is calculated.', type=_non_negative_float, default=50.0)
+    parser.add_argument('--risk', choices=('conservative', 'moderate', 'bullish'), help='Specify the level of risk you would like to take. Choose between `conservative`, `moderate`, or `bullish`.', default='conservative')
+    parser.add_argument('--max_workers', help='Specify the maximum number of ticker symbols to analyze concurrently.', type=_positive_int, default=16)
+    parser.add_argument('--cache_dir', help='Specify the directory used to cache financial statements between runs. Pass an empty string to disable the cache.', default=os.path.join(os.path.expanduser("~"), ".cache", "dcf"))
+    parser.add_argument('--debug', help="Enable debug option. Pass `trace` to also log the full api payloads.", type=_debug_option, default=False)
     args = parser.parse_args()
 
     print("--------- INPUT ARGUMENTS ---------")
@@ -69,11 +112,13 @@ if __name__ == "__main__":
     print(f"Perpetual growth rate -> {args.perpetual_growth_rate} %")
     print(f"Margin of safety -> {args.margin_of_safety} %")
     print(f"Risk -> {args.risk}")
+    print(f"Max workers -> {args.max_workers}")
+    print(f"Cache directory -> {args.cache_dir or 'disabled'}")
     print(f"Debug -> {args.debug}\n")
     
     logger = _configure_logger(args.debug)
 
-    api = FinancialModelingPrep(logger)
+    api = FinancialModelingPrep(logger, cache_dir=args.cache_dir or None)
     model = DiscountedCashFlowModel(
         args.return_percentage,  
         args.years_to_project, 
@@ -83,22 +128,11 @@ if __name__ == "__main__":
         logger
     )
 
-    for tick in args.ticks:
-        print(f"Analyzing ticker symbol {tick}...")
-
-        try:
-            print("Fetching financial statements...")
-            financials = api.get_financials(tick, args.minimum_years, args.maximum_years)
-
-            print("Fetching quote data...")
-            quotes = api.get_quotes(tick)
-        except Exception as e:
-            print(f"Failed to fetch data from api -> {e}")
-            sys.exit()
-
-        try:
-            print("Calculating DCF...")
-            fair_value, fair_value_with_margin_of_safety = model.calculate(tick, financials, quotes)
-            print(f"Fair value -> ${round(fair_value, 2)}\nFair value w/ margin of safety -> ${round(fair_value_with_margin_of_safety, 2)}\n")
-        except Exception as e:
-            print(f"Failed to use DCF model -> {e}")
+    with contextlib.closing(api):
+        analyze = functools.partial(_analyze, api, model, args.minimum_years, args.maximum_years)
+        with ThreadPoolExecutor(max_workers=args.max_workers) as executor:
+            # `map` yields in input order, so results print exactly as the serial loop did
+            for lines, fetched in executor.map(analyze, args.ticks):
+                print("\n".join(lines))
+                if not fetched:
+                    sys.exit()